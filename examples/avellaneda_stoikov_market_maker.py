@@ -1,5 +1,36 @@
-import math
-from typing import Dict, Tuple
+from math import exp as _exp
+from typing import Optional, Tuple, cast
+
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional, without it the quote kernel simply runs as plain python
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+
+        return decorator
+
+
+@njit(cache=True, fastmath=True)
+def _as_quotes(
+    mid_price: float, spread: float, inventory: float, gamma: float, delta: float, l: float
+) -> Tuple[float, float, float, float]:
+    m = -gamma * spread * 0.5
+    inv_delta_half = inventory * delta * 0.5
+    inv_delta_over_l = inventory * delta / l
+
+    bid_price = mid_price - m - inv_delta_half - l
+    ask_price = mid_price + m + inv_delta_half + l
+
+    bid_size = 0.5 * (1 + inv_delta_over_l)
+    ask_size = 0.5 * (1 - inv_delta_over_l)
+
+    return bid_price, bid_size, ask_price, ask_size
+
+
+# Compile the all-float specialization up front so it isn't done on the first live book update
+_as_quotes(1.0, 0.0, 0.0, 0.0, 0.0, 1.0)
 
 
 class AvellanedaStoikovMarketMaker:
@@ -7,21 +38,22 @@ class AvellanedaStoikovMarketMaker:
         self.gamma = gamma
         self.k = k
         self.r = r
+        # delta and l only depend on vol and dt, which are fixed for the lifetime of a strategy,
+        # so they are cached and only recomputed when the caller passes different values
+        self._vol: Optional[float] = None
+        self._dt: Optional[float] = None
+        self._delta = 0.0
+        self._l = 0.0
 
-    def calculate_quotes(self, mid_price: float, spread: float, inventory: float, vol: float, dt: float) -> Dict[str, Tuple[float, float]]:
-        m = -self.gamma * spread / 2
-        delta = self.gamma * (vol ** 2) * dt
-        l = self.k * math.exp(-self.r * dt)
-
-        bid_price = mid_price - m - inventory * delta / 2 - l
-        ask_price = mid_price + m + inventory * delta / 2 + l
-
-        if inventory is None or delta is None:
-            return {"bid": (0, 0), "ask": (0, 0)}
-        bid_size = (1 / 2) * (1 + inventory * delta / l)
-        ask_size = (1 / 2) * (1 - inventory * delta / l)
-
-        return {
-            "bid": (bid_price, bid_size),
-            "ask": (ask_price, ask_size)
-        }
+    def calculate_quotes(self, mid_price: float, spread: float, inventory: float, vol: float, dt: float) -> Tuple[float, float, float, float]:
+        """Returns (bid_price, bid_size, ask_price, ask_size)"""
+        if vol != self._vol or dt != self._dt:
+            self._vol = vol
+            self._dt = dt
+            self._delta = self.gamma * (vol ** 2) * dt
+            self._l = self.k * _exp(-self.r * dt)
+        # njit erases the kernel's signature for type checkers
+        return cast(
+            Tuple[float, float, float, float],
+            _as_quotes(mid_price, spread, float(inventory), self.gamma, self._delta, self._l),
+        )
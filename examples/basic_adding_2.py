@@ -1,7 +1,8 @@
-import json
+import atexit
 import logging
 import threading
 import time
+from dataclasses import dataclass
 
 import eth_account
 from eth_account.signers.local import LocalAccount
@@ -10,17 +11,16 @@ import utils
 from hyperliquid.exchange import Exchange
 from hyperliquid.info import Info
 from hyperliquid.utils import constants
-from hyperliquid.utils.signing import get_timestamp_ms
+from hyperliquid.utils.signing import CancelRequest, get_timestamp_ms
 from hyperliquid.utils.types import (
     L2BookMsg,
     L2BookSubscription,
     UserEventsMsg,
     Side,
-    SIDES,
     Dict,
-    TypedDict,
+    List,
     Optional,
-    Literal,
+    Set,
     Union,
 )
 
@@ -28,28 +28,54 @@ DEPTH = 0.001
 ALLOWABLE_DEVIATION = 0.5
 MAX_POSITION = 20
 COIN = "ARB"
+# How long the poller waits between refreshes when no user events arrive
+POLL_INTERVAL = 30
+# Minimum time between refreshes, so a burst of user events doesn't turn into back to back REST calls
+MIN_POLL_INTERVAL = 2
 
-InFlightOrder = TypedDict(
-    "InFlightOrder", {"type": Literal["in_flight_order"], "time": int})
-Resting = TypedDict(
-    "Resting", {"type": Literal["resting"], "px": float, "oid": int})
-Cancelled = TypedDict("Cancelled", {"type": Literal["cancelled"]})
-Gap = TypedDict("Gap", {"type": Literal["gap"], "oid": int})
-ProvideState = Union[InFlightOrder, Resting, Cancelled, Gap]
+# provide_state transitions happen on every book update, so the states are small slotted classes rather than dicts.
+# __slots__ is declared explicitly because dataclass(slots=True) requires python 3.10
+
+
+@dataclass
+class InFlightOrder:
+    __slots__ = ("time",)
+    time: int
+
+
+@dataclass
+class Resting:
+    __slots__ = ("px", "oid")
+    px: float
+    oid: int
 
 
-def side_to_int(side: Side) -> int:
-    return 1 if side == "A" else -1
+@dataclass
+class Cancelled:
+    __slots__ = ()
 
 
-def side_to_uint(side: Side) -> int:
-    return 1 if side == "A" else 0
+@dataclass
+class Gap:
+    __slots__ = ("px", "oid")
+    px: float
+    oid: int
+
+
+# Cancelled carries no data so a single instance is shared
+CANCELLED = Cancelled()
+ProvideState = Union[InFlightOrder, Resting, Cancelled, Gap]
 
 
 class BasicAdder:
     def __init__(self, wallet: LocalAccount, api_url: str):
         self.info = Info(api_url)
         self.exchange = Exchange(wallet, api_url)
+        # Fills are appended unbuffered so every event is a single write on an already open file
+        self.fills_file = open("fills", "ab", buffering=0)
+        atexit.register(self.fills_file.close)
+        # Set whenever the position is invalidated so the poller refreshes it right away
+        self.refresh_event = threading.Event()
 
         subscription: L2BookSubscription = {"type": "l2Book", "coin": COIN}
         self.info.subscribe(subscription, self.on_book_update)
@@ -57,177 +83,189 @@ class BasicAdder:
             {"type": "userEvents", "user": wallet.address}, self.on_user_events)
         self.position: Optional[float] = None
         self.provide_state: Dict[Side, ProvideState] = {
-            "A": {"type": "cancelled"},
-            "B": {"type": "cancelled"},
+            "A": CANCELLED,
+            "B": CANCELLED,
         }
         self.recently_cancelled_oid_to_time: Dict[int, int] = {}
+        # Oids of our resting orders, kept in sync with provide_state so poll doesn't have to rebuild it
+        self.active_oids: Set[int] = set()
         self.poller = threading.Thread(target=self.poll)
         self.poller.start()
 
     def on_book_update(self, book_msg: L2BookMsg) -> None:
-        logging.debug(f"book_msg {book_msg}")
+        logging.debug("book_msg %s", book_msg)
         book_data = book_msg["data"]
         if book_data["coin"] != COIN:
-            print("Unexpected book message, skipping")
+            logging.warning("Unexpected book message, skipping")
+            return
+        levels = book_data["levels"]
+        best_bid = float(levels[0][0]["px"])
+        best_ask = float(levels[1][0]["px"])
+        # A single timestamp is shared by everything this callback records
+        now = get_timestamp_ms()
+        # SIDES only has two entries, so each side is handled explicitly with its constants baked in
+        ask_distance = best_ask * DEPTH
+        ask_price = best_ask + ask_distance
+        bid_distance = best_bid * DEPTH
+        bid_price = best_bid - bid_distance
+        logging.debug(
+            "on_book_update ask_price:%s ask_distance:%s bid_price:%s bid_distance:%s",
+            ask_price, ask_distance, bid_price, bid_distance)
+        # While the spread is wider than twice the ideal distance, quote inside it instead
+        ask_gap_price = best_bid + ask_distance * 1.5 if best_ask - best_bid > 2 * ask_distance else None
+        bid_gap_price = best_ask - bid_distance * 1.5 if best_ask - best_bid > 2 * bid_distance else None
+
+        # If resting orders are stale, cancel them together in a single request
+        state = self.provide_state
+        ask_oid = self.stale_oid("A", state["A"], ask_price, ask_distance, ask_gap_price, now)
+        bid_oid = self.stale_oid("B", state["B"], bid_price, bid_distance, bid_gap_price, now)
+        if ask_oid is not None or bid_oid is not None:
+            self.cancel_stale({"A": ask_oid, "B": bid_oid}, now)
+
+        # If we aren't providing, maybe place a new order
+        if isinstance(state["A"], Cancelled):
+            self.place_order("A", False, 1, ask_price, ask_gap_price, now)
+        if isinstance(state["B"], Cancelled):
+            self.place_order("B", True, -1, bid_price, bid_gap_price, now)
+
+    def stale_oid(
+        self,
+        side: Side,
+        provide_state: ProvideState,
+        ideal_price: float,
+        ideal_distance: float,
+        gap_price: Optional[float],
+        now: int,
+    ) -> Optional[int]:
+        if isinstance(provide_state, InFlightOrder):
+            if now - provide_state.time > 10000:
+                logging.warning("Order is still in flight after 10s treating as cancelled %s", provide_state)
+                self.provide_state[side] = CANCELLED
+        elif gap_price is not None:
+            if not isinstance(provide_state, Cancelled):
+                oid = provide_state.oid
+                logging.info(
+                    "cancelling order due to gap condition oid: %s side: %s ideal_gap_price: %s", oid, side, gap_price)
+                return oid
+        elif isinstance(provide_state, Resting):
+            distance = abs((ideal_price - provide_state.px))
+            if distance > ALLOWABLE_DEVIATION * ideal_distance:
+                oid = provide_state.oid
+                logging.info(
+                    "cancelling order due to deviation oid:%s side:%s ideal_price:%s px:%s",
+                    oid, side, ideal_price, provide_state.px)
+                return oid
+        return None
+
+    def cancel_stale(self, oid_by_side: Dict[Side, Optional[int]], now: int) -> None:
+        cancels = [(side, oid) for (side, oid) in oid_by_side.items() if oid is not None]
+        response = self.exchange.bulk_cancel([{"coin": COIN, "oid": oid} for (_, oid) in cancels])
+        if response["status"] == "ok":
+            for (side, oid) in cancels:
+                self.recently_cancelled_oid_to_time[oid] = now
+                self.active_oids.discard(oid)
+                self.provide_state[side] = CANCELLED
+        else:
+            logging.error("Failed to cancel orders %s %s", cancels, response)
+
+    def place_order(
+        self, side: Side, is_buy: bool, side_int: int, ideal_price: float, gap_price: Optional[float], now: int
+    ) -> None:
+        state = self.provide_state
+        if self.position is None:
+            logging.debug(
+                "Not placing an order because waiting for next position refresh")
             return
-        for side in SIDES:
-            book_price = float(book_data["levels"]
-                               [side_to_uint(side)][0]["px"])
-            ideal_distance = book_price * DEPTH
-            ideal_price = book_price + (ideal_distance * (side_to_int(side)))
+        order_type = "resting" if gap_price is None else "gap"
+        target_price = ideal_price if gap_price is None else gap_price
+        sz = MAX_POSITION + self.position * side_int
+        if sz * target_price < 10:
             logging.debug(
-                f"on_book_update book_price:{book_price} ideal_distance:{ideal_distance} ideal_price:{ideal_price}"
-            )
-
-            provide_state = self.provide_state[side]
-            best_bid = float(book_data["levels"][0][0]["px"])
-            best_ask = float(book_data["levels"][1][0]["px"])
-            if best_ask - best_bid > 2 * ideal_distance:
-                if side == "A":
-                    gap_price = best_bid + ideal_distance * 1.5
-                elif side == "B":
-                    gap_price = best_ask - ideal_distance * 1.5
-
-                if provide_state["type"] != "cancelled":
-                    oid = provide_state["oid"]
-                    print(
-                        f"cancelling order due to gap condition oid: {oid} side: {side} ideal_gap_price: {gap_price} best_ask: {best_ask} best_bid: {best_bid}, book_price: {book_price}")
-
-                    response = self.exchange.cancel(COIN, oid)
-                    if response["status"] == "ok":
-                        self.recently_cancelled_oid_to_time[oid] = get_timestamp_ms(
-                        )
-                        self.provide_state[side] = {"type": "cancelled"}
-                    else:
-                        print(
-                            f"Failed to cancel order {provide_state} {side}", response)
-
-                if self.provide_state[side]["type"] == "cancelled":
-                    if self.position is None:
-                        logging.debug(
-                            "Not placing an order because waiting for next position refresh")
-                        continue
-                    sz = MAX_POSITION + self.position * (side_to_int(side))
-                    if sz * gap_price < 10:
-                        logging.debug(
-                            "Not placing an order because at position limit")
-                        continue
-                    px = float(f"{gap_price:.5g}")
-                    print(f"placing gap order sz:{sz} px:{px} side:{side}")
-                    self.provide_state[side] = {
-                        "type": "in_flight_order", "time": get_timestamp_ms()}
-                    response = self.exchange.order(COIN, side == "B", sz, px, {
-                        "limit": {"tif": "Alo"}})
-                    print("placed gap order", response)
-                    if response["status"] == "ok":
-                        status = response["response"]["data"]["statuses"][0]
-                        if "resting" in status:
-                            self.provide_state[side] = {
-                                "type": "gap", "px": px, "oid": status["resting"]["oid"]}
-                        else:
-                            print(
-                                "Unexpected response from placing gap order. Setting position to None.", response)
-                            self.provide_state[side] = {"type": "cancelled"}
-                            self.position = None
-
-            if provide_state["type"] == "resting":
-                distance = abs((ideal_price - provide_state["px"]))
-                if distance > ALLOWABLE_DEVIATION * ideal_distance:
-                    oid = provide_state["oid"]
-                    print(
-                        f"cancelling order due to deviation oid:{oid} side:{side} ideal_price:{ideal_price} px:{provide_state['px']}"
-                    )
-                    response = self.exchange.cancel(COIN, oid)
-                    if response["status"] == "ok":
-                        self.recently_cancelled_oid_to_time[oid] = get_timestamp_ms(
-                        )
-                        self.provide_state[side] = {"type": "cancelled"}
-                    else:
-                        print(
-                            f"Failed to cancel order {provide_state} {side}", response)
-            elif provide_state["type"] == "in_flight_order":
-                if get_timestamp_ms() - provide_state["time"] > 10000:
-                    print(
-                        "Order is still in flight after 10s treating as cancelled", provide_state)
-                    self.provide_state[side] = {"type": "cancelled"}
-
-            # If we aren't providing, maybe place a new order
-            provide_state = self.provide_state[side]
-            if provide_state["type"] == "cancelled":
-                if self.position is None:
-                    logging.debug(
-                        "Not placing an order because waiting for next position refresh")
-                    continue
-                sz = MAX_POSITION + self.position * (side_to_int(side))
-                if sz * ideal_price < 10:
-                    logging.debug(
-                        "Not placing an order because at position limit")
-                    continue
-                # prices should have at most 5 significant digits
-                px = float(f"{ideal_price:.5g}")
-                print(f"placing order sz:{sz} px:{px} side:{side}")
-                self.provide_state[side] = {
-                    "type": "in_flight_order", "time": get_timestamp_ms()}
-                response = self.exchange.order(COIN, side == "B", sz, px, {
-                                               "limit": {"tif": "Alo"}})
-                print("placed order", response)
-                if response["status"] == "ok":
-                    status = response["response"]["data"]["statuses"][0]
-                    if "resting" in status:
-                        self.provide_state[side] = {
-                            "type": "resting", "px": px, "oid": status["resting"]["oid"]}
-                    else:
-                        print(
-                            "Unexpected response from placing order. Setting position to None.", response)
-                        self.provide_state[side] = {"type": "cancelled"}
-                        self.position = None
+                "Not placing an order because at position limit")
+            return
+        # prices should have at most 5 significant digits
+        px = utils.round_sig(target_price)
+        logging.info("placing %s order sz:%s px:%s side:%s", order_type, sz, px, side)
+        state[side] = InFlightOrder(now)
+        response = self.exchange.order(COIN, is_buy, sz, px, {
+                                       "limit": {"tif": "Alo"}})
+        logging.info("placed %s order %s", order_type, response)
+        if response["status"] == "ok":
+            status = response["response"]["data"]["statuses"][0]
+            if "resting" in status:
+                oid = status["resting"]["oid"]
+                state[side] = Resting(px, oid) if gap_price is None else Gap(px, oid)
+                self.active_oids.add(oid)
+            else:
+                logging.error(
+                    "Unexpected response from placing %s order. Setting position to None. %s", order_type, response)
+                state[side] = CANCELLED
+                self.position = None
+                self.refresh_event.set()
 
     def on_user_events(self, user_events: UserEventsMsg) -> None:
-        print(user_events)
+        logging.info("user_events %s", user_events)
         user_events_data = user_events["data"]
         if "fills" in user_events_data:
-            with open("fills", "a+") as f:
-                f.write(json.dumps(user_events_data["fills"]))
-                f.write("\n")
+            self.fills_file.write(utils.dumps_bytes(user_events_data["fills"]) + b"\n")
         # Set the position to None so that we don't place more orders without knowing our position
         # You might want to also update provide_state to account for the fill. This could help avoid sending an
         # unneeded cancel or failing to send a new order to replace the filled order, but we skipped this logic
         # to make the example simpler
         self.position = None
+        self.refresh_event.set()
 
     def poll(self):
+        info = self.info
+        bulk_cancel = self.exchange.bulk_cancel
+        address = self.exchange.wallet.address
         while True:
-            open_orders = self.info.open_orders(self.exchange.wallet.address)
-            print("open_orders", open_orders)
-            ok_oids = set(self.recently_cancelled_oid_to_time.keys())
-            for provide_state in self.provide_state.values():
-                if provide_state["type"] == "resting" or provide_state["type"] == "gap":
-                    ok_oids.add(provide_state["oid"])
+            last_refresh = time.monotonic()
+            open_orders = info.open_orders(address)
+            logging.debug("open_orders %s", open_orders)
+            ok_oids = self.active_oids | self.recently_cancelled_oid_to_time.keys()
 
+            unknown_orders: List[CancelRequest] = []
             for open_order in open_orders:
                 if open_order["coin"] == COIN and open_order["oid"] not in ok_oids:
-                    print("Cancelling unknown oid", open_order["oid"])
-                    self.exchange.cancel(open_order["coin"], open_order["oid"])
+                    logging.info("Cancelling unknown oid %s", open_order["oid"])
+                    unknown_orders.append({"coin": open_order["coin"], "oid": open_order["oid"]})
+            if unknown_orders:
+                bulk_cancel(unknown_orders)
 
+            # Forget cancelled oids after 30s, by then they should no longer show up as open orders
             current_time = get_timestamp_ms()
-            self.recently_cancelled_oid_to_time = {
-                oid: timestamp
-                for (oid, timestamp) in self.recently_cancelled_oid_to_time.items()
+            recently_cancelled_oid_to_time = self.recently_cancelled_oid_to_time
+            expired_oids = [
+                oid
+                for (oid, timestamp) in recently_cancelled_oid_to_time.items()
                 if current_time - timestamp > 30000
-            }
+            ]
+            for oid in expired_oids:
+                del recently_cancelled_oid_to_time[oid]
 
-            user_state = self.info.user_state(self.exchange.wallet.address)
-            for position in user_state["assetPositions"]:
-                if position["position"]["coin"] == COIN:
-                    self.position = float(position["position"]["szi"])
-                    print(f"set position to {self.position}")
-                    break
-            time.sleep(10)
+            user_state = info.user_state(address)
+            positions_by_coin = {
+                asset_position["position"]["coin"]: asset_position["position"]
+                for asset_position in user_state["assetPositions"]
+            }
+            position = positions_by_coin.get(COIN)
+            if position is not None:
+                self.position = float(position["szi"])
+                logging.info("set position to %s", self.position)
+            # Sleep until a user event invalidates the position, or at most POLL_INTERVAL seconds
+            self.refresh_event.wait(POLL_INTERVAL)
+            elapsed = time.monotonic() - last_refresh
+            if elapsed < MIN_POLL_INTERVAL:
+                time.sleep(MIN_POLL_INTERVAL - elapsed)
+            # Cleared only after the minimum interval so events arriving meanwhile share the next refresh
+            self.refresh_event.clear()
 
 
 def main():
-    # Setting this to logging.DEBUG can be helpful for debugging websocket callback issues
-    logging.basicConfig(level=logging.ERROR)
+    # Order and position activity is logged at INFO, per message details at DEBUG. Setting this to logging.DEBUG can be
+    # helpful for debugging websocket callback issues
+    logging.basicConfig(level=logging.INFO)
     config = utils.get_config()
     account = eth_account.Account.from_key(config["secret_key"])
     print("Running with account address:", account.address)
@@ -1,7 +1,8 @@
-import json
+import atexit
 import logging
 import threading
 import time
+from dataclasses import dataclass
 
 import eth_account
 from eth_account.signers.local import LocalAccount
@@ -10,17 +11,16 @@ import utils
 from hyperliquid.exchange import Exchange
 from hyperliquid.info import Info
 from hyperliquid.utils import constants
-from hyperliquid.utils.signing import get_timestamp_ms
+from hyperliquid.utils.signing import CancelRequest, get_timestamp_ms
 from hyperliquid.utils.types import (
     L2BookMsg,
     L2BookSubscription,
     UserEventsMsg,
     Side,
-    SIDES,
     Dict,
-    TypedDict,
+    List,
     Optional,
-    Literal,
+    Set,
     Union,
 )
 
@@ -36,21 +36,36 @@ DT = 0.05
 # i.e. using the same example as above of a best bid of $1000 and targeted depth of .3%. The ideal distance is $3, so
 # bids within $3 * 0.5 = $1.5 will not be cancelled. So any bids > $998.5 or < $995.5 will be cancelled and replaced.
 ALLOWABLE_DEVIATION = 0.5
+# How long the poller waits between refreshes when no user events arrive
+POLL_INTERVAL = 30
+# Minimum time between refreshes, so a burst of user events doesn't turn into back to back REST calls
+MIN_POLL_INTERVAL = 2
+
+# provide_state transitions happen on every book update, so the states are small slotted classes rather than dicts.
+# __slots__ is declared explicitly because dataclass(slots=True) requires python 3.10
 
-InFlightOrder = TypedDict(
-    "InFlightOrder", {"type": Literal["in_flight_order"], "time": int})
-Resting = TypedDict(
-    "Resting", {"type": Literal["resting"], "px": float, "oid": int})
-Cancelled = TypedDict("Cancelled", {"type": Literal["cancelled"]})
-ProvideState = Union[InFlightOrder, Resting, Cancelled]
 
+@dataclass
+class InFlightOrder:
+    __slots__ = ("time",)
+    time: int
 
-def side_to_int(side: Side) -> int:
-    return 1 if side == "A" else -1
 
+@dataclass
+class Resting:
+    __slots__ = ("px", "oid")
+    px: float
+    oid: int
 
-def side_to_uint(side: Side) -> int:
-    return 1 if side == "A" else 0
+
+@dataclass
+class Cancelled:
+    __slots__ = ()
+
+
+# Cancelled carries no data so a single instance is shared
+CANCELLED = Cancelled()
+ProvideState = Union[InFlightOrder, Resting, Cancelled]
 
 
 class BasicAdder:
@@ -64,10 +79,17 @@ class BasicAdder:
         self.exchange = None
         self.position = None
         self.provide_state = {
-            "A": {"type": "cancelled"},
-            "B": {"type": "cancelled"},
+            "A": CANCELLED,
+            "B": CANCELLED,
         }
         self.recently_cancelled_oid_to_time = {}
+        # Oids of our resting orders, kept in sync with provide_state so poll doesn't have to rebuild it
+        self.active_oids: Set[int] = set()
+        # Fills are appended unbuffered so every event is a single write on an already open file
+        self.fills_file = open("fills", "ab", buffering=0)
+        atexit.register(self.fills_file.close)
+        # Set whenever the position is invalidated so the poller refreshes it right away
+        self.refresh_event = threading.Event()
 
         self.market_maker = AvellanedaStoikovMarketMaker(gamma=GAMMA, k=K, r=R)
         self.poller = None
@@ -102,124 +124,158 @@ class BasicAdder:
                     raise
 
     def on_book_update(self, book_msg: L2BookMsg) -> None:
-        logging.debug(f"book_msg {book_msg}")
+        logging.debug("book_msg %s", book_msg)
         book_data = book_msg["data"]
         if book_data["coin"] != self.coin:
-            print("Unexpected book message, skipping")
+            logging.warning("Unexpected book message, skipping")
             return
-        mid_price = (float(book_data["levels"][0][0]["px"]) +
-                     float(book_data["levels"][1][0]["px"])) / 2
-        spread = float(book_data["levels"][1][0]["px"]) - \
-            float(book_data["levels"][0][0]["px"])
-
-        for side in SIDES:
-            # Calculate the bid and ask quotes using the Avellaneda-Stoikov model
-            position = self.position if self.position is not None else 0
-            quotes = self.market_maker.calculate_quotes(
-                mid_price, spread, position, VOL, DT)
-            quote_price, quote_size = quotes["bid"] if side == "B" else quotes["ask"]
-
-            logging.debug(
-                f"on_book_update quote_price:{quote_price} quote_size:{quote_size}")
-
-            # If a resting order exists, maybe cancel it
-            provide_state = self.provide_state[side]
-            if provide_state["type"] == "resting":
-                distance = abs((quote_price - provide_state["px"]))
-                if distance > ALLOWABLE_DEVIATION * spread:
-                    oid = provide_state["oid"]
-                    print(
-                        f"cancelling order due to deviation oid:{oid} side:{side} ideal_price:{quote_price} px:{provide_state['px']}"
-                    )
-                    response = self.exchange.cancel(self.coin, oid)
-                    if response["status"] == "ok":
-                        self.recently_cancelled_oid_to_time[oid] = get_timestamp_ms(
-                        )
-                        self.provide_state[side] = {"type": "cancelled"}
-                    else:
-                        print(
-                            f"Failed to cancel order {provide_state} {side}", response)
-            elif provide_state["type"] == "in_flight_order":
-                if get_timestamp_ms() - provide_state["time"] > 10000:
-                    print(
-                        "Order is still in flight after 10s treating as cancelled", provide_state)
-                    self.provide_state[side] = {"type": "cancelled"}
-
-            # If we aren't providing, maybe place a new order
-            provide_state = self.provide_state[side]
-            if provide_state["type"] == "cancelled":
-                sz = self.target_size + position * (side_to_int(side))
-                # if sz * quote_price < 10:
-                #     print(
-                #         "Not placing an order because at position limit")
-                #     continue
-                # prices should have at most 5 significant digits
-                px = float(f"{quote_price:.5g}")
-                print(f"placing order sz:{sz} px:{px} side:{side}")
-                self.provide_state[side] = {
-                    "type": "in_flight_order", "time": get_timestamp_ms()}
-                response = self.exchange.order(self.coin, side == "B", sz, px, {
-                                               "limit": {"tif": "Alo"}})
-                print("placed order", response)
-                if response["status"] == "ok":
-                    status = response["response"]["data"]["statuses"][0]
-                    if "resting" in status:
-                        self.provide_state[side] = {
-                            "type": "resting", "px": px, "oid": status["resting"]["oid"]}
-                    else:
-                        print(
-                            "Unexpected response from placing order. Setting position to None.", response)
-                        self.provide_state[side] = {"type": "cancelled"}
-                        self.position = None
+        levels = book_data["levels"]
+        best_bid = float(levels[0][0]["px"])
+        best_ask = float(levels[1][0]["px"])
+        mid_price = (best_bid + best_ask) * 0.5
+        spread = best_ask - best_bid
+
+        # Calculate the bid and ask quotes using the Avellaneda-Stoikov model
+        position = self.position if self.position is not None else 0.0
+        bid_price, bid_size, ask_price, ask_size = self.market_maker.calculate_quotes(
+            mid_price, spread, position, VOL, DT)
+        logging.debug(
+            "on_book_update bid_price:%s bid_size:%s ask_price:%s ask_size:%s",
+            bid_price, bid_size, ask_price, ask_size)
+
+        # A single timestamp is shared by everything this callback records
+        now = get_timestamp_ms()
+        # SIDES only has two entries, so each side is handled explicitly with its constants passed in
+        # If resting orders deviate too far from the quotes, cancel them together in a single request
+        state = self.provide_state
+        ask_oid = self.stale_oid("A", state["A"], ask_price, spread, now)
+        bid_oid = self.stale_oid("B", state["B"], bid_price, spread, now)
+        if ask_oid is not None or bid_oid is not None:
+            self.cancel_stale({"A": ask_oid, "B": bid_oid}, now)
+
+        # If we aren't providing, maybe place a new order
+        if isinstance(state["A"], Cancelled):
+            self.place_order("A", False, 1, ask_price, position, now)
+        if isinstance(state["B"], Cancelled):
+            self.place_order("B", True, -1, bid_price, position, now)
+
+    def stale_oid(
+        self, side: Side, provide_state: ProvideState, quote_price: float, spread: float, now: int
+    ) -> Optional[int]:
+        if isinstance(provide_state, Resting):
+            distance = abs((quote_price - provide_state.px))
+            if distance > ALLOWABLE_DEVIATION * spread:
+                oid = provide_state.oid
+                logging.info(
+                    "cancelling order due to deviation oid:%s side:%s ideal_price:%s px:%s",
+                    oid, side, quote_price, provide_state.px)
+                return oid
+        elif isinstance(provide_state, InFlightOrder):
+            if now - provide_state.time > 10000:
+                logging.warning("Order is still in flight after 10s treating as cancelled %s", provide_state)
+                self.provide_state[side] = CANCELLED
+        return None
+
+    def cancel_stale(self, oid_by_side: Dict[Side, Optional[int]], now: int) -> None:
+        cancels = [(side, oid) for (side, oid) in oid_by_side.items() if oid is not None]
+        response = self.exchange.bulk_cancel([{"coin": self.coin, "oid": oid} for (_, oid) in cancels])
+        if response["status"] == "ok":
+            for (side, oid) in cancels:
+                self.recently_cancelled_oid_to_time[oid] = now
+                self.active_oids.discard(oid)
+                self.provide_state[side] = CANCELLED
+        else:
+            logging.error("Failed to cancel orders %s %s", cancels, response)
+
+    def place_order(self, side: Side, is_buy: bool, side_int: int, quote_price: float, position: float,
+                    now: int) -> None:
+        state = self.provide_state
+        sz = self.target_size + position * side_int
+        # if sz * quote_price < 10:
+        #     logging.debug(
+        #         "Not placing an order because at position limit")
+        #     return
+        # prices should have at most 5 significant digits
+        px = utils.round_sig(quote_price)
+        logging.info("placing order sz:%s px:%s side:%s", sz, px, side)
+        state[side] = InFlightOrder(now)
+        response = self.exchange.order(self.coin, is_buy, sz, px, {
+                                       "limit": {"tif": "Alo"}})
+        logging.info("placed order %s", response)
+        if response["status"] == "ok":
+            status = response["response"]["data"]["statuses"][0]
+            if "resting" in status:
+                oid = status["resting"]["oid"]
+                state[side] = Resting(px, oid)
+                self.active_oids.add(oid)
+            else:
+                logging.error("Unexpected response from placing order. Setting position to None. %s", response)
+                state[side] = CANCELLED
+                self.position = None
+                self.refresh_event.set()
 
     def on_user_events(self, user_events: UserEventsMsg) -> None:
-        print(user_events)
+        logging.info("user_events %s", user_events)
         user_events_data = user_events["data"]
         if "fills" in user_events_data:
-            with open("fills", "a+") as f:
-                f.write(json.dumps(user_events_data["fills"]))
-                f.write("\n")
+            self.fills_file.write(utils.dumps_bytes(user_events_data["fills"]) + b"\n")
         # Set the position to None so that we don't place more orders without knowing our position
         # You might want to also update provide_state to account for the fill. This could help avoid sending an
         # unneeded cancel or failing to send a new order to replace the filled order, but we skipped this logic
         # to make the example simpler
         self.position = None
+        self.refresh_event.set()
 
     def poll(self):
         while True:
+            last_refresh = time.monotonic()
             open_orders = self.info.open_orders(self.exchange.wallet.address)
-            print("open_orders", open_orders)
+            logging.debug("open_orders %s", open_orders)
 
-            ok_oids = set(self.recently_cancelled_oid_to_time.keys())
-            for provide_state in self.provide_state.values():
-                if provide_state["type"] == "resting":
-                    ok_oids.add(provide_state["oid"])
+            ok_oids = self.active_oids | self.recently_cancelled_oid_to_time.keys()
 
+            unknown_orders: List[CancelRequest] = []
             for open_order in open_orders:
-                print("Checking open_order:", open_order)
+                logging.debug("Checking open_order: %s", open_order)
                 if open_order["coin"] == self.coin and open_order["oid"] not in ok_oids:
-                    print("Cancelling unknown oid", open_order["oid"])
-                    self.exchange.cancel(open_order["coin"], open_order["oid"])
+                    logging.info("Cancelling unknown oid %s", open_order["oid"])
+                    unknown_orders.append({"coin": open_order["coin"], "oid": open_order["oid"]})
+            if unknown_orders:
+                self.exchange.bulk_cancel(unknown_orders)
 
+            # Forget cancelled oids after 30s, by then they should no longer show up as open orders
             current_time = get_timestamp_ms()
-            self.recently_cancelled_oid_to_time = {
-                oid: timestamp
-                for (oid, timestamp) in self.recently_cancelled_oid_to_time.items()
+            recently_cancelled_oid_to_time = self.recently_cancelled_oid_to_time
+            expired_oids = [
+                oid
+                for (oid, timestamp) in recently_cancelled_oid_to_time.items()
                 if current_time - timestamp > 30000
-            }
+            ]
+            for oid in expired_oids:
+                del recently_cancelled_oid_to_time[oid]
 
             user_state = self.info.user_state(self.exchange.wallet.address)
-            for position in user_state["assetPositions"]:
-                if position["position"]["coin"] == self.coin:
-                    self.position = float(position["position"]["szi"])
-                    print(f"set position to {self.position}")
-                    break
-            time.sleep(10)
+            positions_by_coin = {
+                asset_position["position"]["coin"]: asset_position["position"]
+                for asset_position in user_state["assetPositions"]
+            }
+            position = positions_by_coin.get(self.coin)
+            if position is not None:
+                self.position = float(position["szi"])
+                logging.info("set position to %s", self.position)
+            # Sleep until a user event invalidates the position, or at most POLL_INTERVAL seconds
+            self.refresh_event.wait(POLL_INTERVAL)
+            elapsed = time.monotonic() - last_refresh
+            if elapsed < MIN_POLL_INTERVAL:
+                time.sleep(MIN_POLL_INTERVAL - elapsed)
+            # Cleared only after the minimum interval so events arriving meanwhile share the next refresh
+            self.refresh_event.clear()
 
 
 def main():
-    # Setting this to logging.DEBUG can be helpful for debugging websocket callback issues
-    logging.basicConfig(level=logging.ERROR)
+    # Order and position activity is logged at INFO, per message details at DEBUG. Setting this to logging.DEBUG can be
+    # helpful for debugging websocket callback issues
+    logging.basicConfig(level=logging.INFO)
     config = utils.get_config()
 
     bot_count = 1
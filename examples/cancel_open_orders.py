@@ -17,7 +17,8 @@ def main():
     open_orders = info.open_orders(account.address)
     for open_order in open_orders:
         print(f"cancelling order {open_order}")
-        exchange.cancel(open_order["coin"], open_order["oid"])
+    if open_orders:
+        exchange.bulk_cancel([{"coin": open_order["coin"], "oid": open_order["oid"]} for open_order in open_orders])
 
 
 if __name__ == "__main__":
@@ -1,8 +1,30 @@
+import math
 import os
 import json
 
+from typing import Any, Callable
+
+try:
+    # orjson is optional, it only speeds up serializing fills
+    import orjson
+
+    dumps_bytes: Callable[[Any], bytes] = orjson.dumps
+except ImportError:
+
+    def _json_dumps_bytes(obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+
+    dumps_bytes = _json_dumps_bytes
+
 
 def get_config():
     config_path = os.path.join(os.path.dirname(__file__), "config.json")
     with open(config_path) as f:
         return json.load(f)
+
+
+def round_sig(x: float, sig: int = 5) -> float:
+    # Same result as float(f"{x:.{sig}g}") without formatting to and parsing from a string
+    if x == 0:
+        return 0.0
+    return round(x, sig - int(math.floor(math.log10(abs(x)))) - 1)
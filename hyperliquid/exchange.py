@@ -5,6 +5,7 @@ from eth_account.signers.local import LocalAccount
 from hyperliquid.api import API
 from hyperliquid.info import Info
 from hyperliquid.utils.signing import (
+    CancelRequest,
     OrderSpec,
     order_spec_preprocessing,
     order_grouping_to_number,
@@ -14,7 +15,7 @@ from hyperliquid.utils.signing import (
     order_spec_to_order_wire,
     get_timestamp_ms,
 )
-from hyperliquid.utils.types import Meta, Any, Literal, Optional
+from hyperliquid.utils.types import Meta, Any, List, Literal, Optional
 
 
 class Exchange(API):
@@ -72,12 +73,17 @@ class Exchange(API):
         return self.post("/exchange", payload)
 
     def cancel(self, coin: str, oid: int) -> Any:
+        return self.bulk_cancel([{"coin": coin, "oid": oid}])
+
+    def bulk_cancel(self, cancel_requests: List[CancelRequest]) -> Any:
+        if len(cancel_requests) == 0:
+            raise ValueError("bulk_cancel requires at least one cancel request")
         timestamp = get_timestamp_ms()
-        asset = self.coin_to_asset[coin]
+        cancels = [(self.coin_to_asset[cancel["coin"]], cancel["oid"]) for cancel in cancel_requests]
         signature = sign_l1_action(
             self.wallet,
             ["(uint32,uint64)[]"],
-            [[(asset, oid)]],
+            [cancels],
             ZERO_ADDRESS if self.vault_address is None else self.vault_address,
             timestamp,
         )
@@ -91,6 +97,7 @@ class Exchange(API):
                             "asset": asset,
                             "oid": oid,
                         }
+                        for (asset, oid) in cancels
                     ],
                 },
                 "nonce": timestamp,
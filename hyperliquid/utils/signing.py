@@ -51,6 +51,7 @@ def order_grouping_to_number(grouping: Grouping) -> int:
 
 Order = TypedDict("Order", {"asset": int, "isBuy": bool, "limitPx": float, "sz": float, "reduceOnly": bool})
 OrderSpec = TypedDict("OrderSpec", {"order": Order, "orderType": OrderType})
+CancelRequest = TypedDict("CancelRequest", {"coin": str, "oid": int})
 
 
 def order_spec_preprocessing(order_spec: OrderSpec) -> Any:
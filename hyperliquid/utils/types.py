@@ -5,7 +5,7 @@ if sys.version_info >= (3, 8):
 else:
     from typing_extensions import TypedDict, Literal
 
-from typing import List, Union, Dict, Tuple, Any, Optional, cast, Callable, NamedTuple
+from typing import List, Union, Dict, Set, Tuple, Any, Optional, cast, Callable, NamedTuple
 
 Any = Any
 Option = Optional
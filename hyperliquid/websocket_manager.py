@@ -6,6 +6,14 @@ import websocket
 
 from hyperliquid.utils.types import Subscription, WsMsg, Callable, Any, NamedTuple, Optional, List, Tuple, Dict
 
+try:
+    # orjson is considerably faster at decoding the high rate websocket messages, but it is optional
+    import orjson
+
+    json_loads: Callable[[str], Any] = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 ActiveSubscription = NamedTuple("ActiveSubscription", [("callback", Callable[[Any], None]), ("subscription_id", int)])
 
 
@@ -52,8 +60,8 @@ class WebsocketManager(threading.Thread):
         if message == "Websocket connection established.":
             logging.debug(message)
             return
-        logging.debug(f"on_message {message}")
-        ws_msg: WsMsg = json.loads(message)
+        logging.debug("on_message %s", message)
+        ws_msg: WsMsg = json_loads(message)
         identifier = ws_msg_to_identifier(ws_msg)
         if identifier is None:
             logging.debug("Websocket not handling empty message")
@@ -4,6 +4,7 @@ import eth_account
 import pytest
 from eth_utils import to_hex
 
+from hyperliquid.exchange import Exchange
 from hyperliquid.utils.signing import (
     ZERO_ADDRESS,
     construct_phantom_agent,
@@ -13,6 +14,7 @@ from hyperliquid.utils.signing import (
     float_to_int_for_hashing,
     sign_l1_action,
 )
+from hyperliquid.utils.types import Meta
 
 
 def test_phantom_agent_creation_matches_production():
@@ -54,6 +56,39 @@ def test_l1_action_signing_matches_with_vault():
     assert signature["v"] == 27
 
 
+def test_l1_action_signing_bulk_cancel_matches():
+    wallet = eth_account.Account.from_key("0x0123456789012345678901234567890123456789012345678901234567890123")
+    signature = sign_l1_action(wallet, ["(uint32,uint64)[]"], [[(1, 82), (5, 83)]], None, 0)
+    assert signature["r"] == "0xc17721a97466308f93f8f1b1d821e825e4e07802379c2095e3bfbc64f7cbc424"
+    assert signature["s"] == "0x29337dfe8d6c4912118c26ea8de4e957c0b6f12fcb038301ccc15145991cf113"
+    assert signature["v"] == 28
+
+
+def test_bulk_cancel_signs_all_cancels(monkeypatch):
+    wallet = eth_account.Account.from_key("0x0123456789012345678901234567890123456789012345678901234567890123")
+    meta: Meta = {
+        "universe": [{"name": name, "szDecimals": 0} for name in ["BTC", "ETH", "ATOM", "MATIC", "DYDX", "SOL"]]
+    }
+    exchange = Exchange(wallet, meta=meta)
+    posted = []
+    monkeypatch.setattr("hyperliquid.exchange.get_timestamp_ms", lambda: 0)
+    monkeypatch.setattr(exchange, "post", lambda url_path, payload: posted.append((url_path, payload)))
+
+    exchange.bulk_cancel([{"coin": "ETH", "oid": 82}, {"coin": "SOL", "oid": 83}])
+
+    url_path, payload = posted[0]
+    assert url_path == "/exchange"
+    assert payload["action"] == {"type": "cancel", "cancels": [{"asset": 1, "oid": 82}, {"asset": 5, "oid": 83}]}
+    assert payload["nonce"] == 0
+    assert payload["signature"] == {
+        "r": "0xc17721a97466308f93f8f1b1d821e825e4e07802379c2095e3bfbc64f7cbc424",
+        "s": "0x29337dfe8d6c4912118c26ea8de4e957c0b6f12fcb038301ccc15145991cf113",
+        "v": 28,
+    }
+    with pytest.raises(ValueError):
+        exchange.bulk_cancel([])
+
+
 def test_float_to_int_for_hashing():
     assert float_to_int_for_hashing(123123123123) == 12312312312300000000
     assert float_to_int_for_hashing(0.00001231) == 1231